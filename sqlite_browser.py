@@ -17,6 +17,8 @@ Controls:
     Enter    - select/enter table
     v        - toggle column/inline view
     i        - view schema for selected table
+    r        - recount rows and sizes
+    R        - recount, counting huge tables exactly too
     s        - execute arbitrary SQL query
     q        - quit
 
@@ -30,23 +32,43 @@ Controls:
     s        - execute arbitrary SQL query
     b or q   - back to table list
 """
+import array
+import atexit
+import base64
+import collections
 import curses
 import json
 import os
+import pathlib
 import sqlite3
 import re
 import subprocess
 import shutil
 import sys
 import tempfile
-import textwrap
+import threading
+
+try:
+    import orjson  # optional: faster (de)serialization of edited records
+except ImportError:
+    orjson = None
+
+# rows fetched per query in the record view, and how many such pages to keep
+PAGE_SIZE = 200
+PAGE_CACHE = 3
+# tables counted per UNION ALL query (SQLite caps a compound select at 500 terms)
+COUNT_CHUNK = 100
+# tables are counted only up to this many rows unless an exact count is asked for
+APPROX_ROWS = 1000000
 
 
 def main(stdscr, db_path):
     conn = sqlite3.connect(db_path)
-    # allow non-UTF-8 text by replacing invalid bytes, so viewer doesn't crash on malformed data
-    conn.text_factory = lambda b: b.decode('utf-8', 'replace')
+    apply_pragmas(conn, db_path)
+    register_functions(conn)
     conn.row_factory = sqlite3.Row
+    # autocommit: read transactions are opened and closed explicitly (begin_read)
+    conn.isolation_level = None
     curses.curs_set(0)
     # reduce ESC key delay so ESC returns promptly in schema view
     if hasattr(curses, 'set_escdelay'):
@@ -61,102 +83,569 @@ def main(stdscr, db_path):
         view_table(stdscr, conn, table)
 
 
-def table_menu(stdscr, conn):
-    cursor = conn.execute("SELECT name FROM sqlite_master WHERE type='table' ORDER BY name")
-    tables = [row['name'] for row in cursor]
-    if not tables:
-        return None
-    # pre-fetch record counts and approximate table sizes (requires dbstat virtual table)
-    counts = {}
+def quote_ident(name):
+    """
+    Quote an identifier (table, column or index name) for use in SQL text.
+    """
+    return '"' + name.replace('"', '""') + '"'
+
+
+# per-table statements; {t} is the quoted table name, {set} the SET list of an UPDATE
+_TABLE_SQL = {
+    'count': "SELECT COUNT(*) FROM {t}",
+    'count_upto': "SELECT COUNT(*) FROM (SELECT 1 FROM {t} LIMIT ?)",
+    'min_rowid': "SELECT min(rowid) FROM {t}",
+    'max_rowid': "SELECT max(rowid) FROM {t}",
+    'next': "SELECT rowid, * FROM {t} WHERE rowid > ? ORDER BY rowid LIMIT ?",
+    'prev': "SELECT rowid, * FROM {t} WHERE rowid < ? ORDER BY rowid DESC LIMIT ?",
+    'offset': "SELECT rowid, * FROM {t} ORDER BY rowid LIMIT ? OFFSET ?",
+    'delete': "DELETE FROM {t} WHERE rowid=?",
+    'update': "UPDATE {t} SET {set} WHERE rowid=?",
+}
+# SQL text by (op, table, columns), built once so that every use passes the
+# identical string and hits the connection's prepared statement cache
+_prepared = {}
+
+
+def table_sql(op, table, cols=()):
+    """
+    Return the statement op of _TABLE_SQL for table; cols are the columns
+    assigned by an 'update'.
+    """
+    key = (op, table, cols)
+    sql = _prepared.get(key)
+    if sql is None:
+        set_clause = ', '.join(f"{quote_ident(c)}=?" for c in cols)
+        sql = _prepared[key] = _TABLE_SQL[op].format(t=quote_ident(table), set=set_clause)
+    return sql
+
+
+def decode_lenient(b):
+    return b.decode('utf-8', 'replace')
+
+
+def allow_invalid_text(conn, error):
+    """
+    Text is decoded by sqlite3's built-in str factory until some value turns
+    out not to be valid UTF-8; from then on the connection decodes with invalid
+    bytes replaced, so the viewer doesn't crash on malformed data. Returns True
+    if error was such a decoding failure and the caller should retry.
+    """
+    if conn.text_factory is decode_lenient or 'decode' not in str(error):
+        return False
+    conn.text_factory = decode_lenient
+    return True
+
+
+def fetch_all(conn, sql, params=()):
+    """
+    Run a query and fetch all rows, retrying once with lenient decoding if some
+    text turns out not to be valid UTF-8 (see allow_invalid_text).
+    """
+    try:
+        return conn.execute(sql, params).fetchall()
+    except sqlite3.OperationalError as e:
+        if not allow_invalid_text(conn, e):
+            raise
+        return conn.execute(sql, params).fetchall()
+
+
+def begin_read(conn):
+    """
+    Open a deferred transaction unless one is active, so that a run of reads
+    shares one snapshot instead of taking and dropping the lock per statement.
+    Returns True if this call opened it.
+    """
+    if conn.in_transaction:
+        return False
+    conn.execute("BEGIN")
+    return True
+
+
+def end_read(conn):
+    if conn.in_transaction:
+        conn.commit()
+
+
+# True once apply_pragmas has switched the database to WAL
+_wal = False
+
+
+def begin_browse(conn):
+    """
+    Open the read transaction the record view browses in, only in WAL mode:
+    with a rollback journal its shared lock would block every other writer
+    for as long as the table is on screen.
+    """
+    if _wal:
+        begin_read(conn)
+
+
+def apply_pragmas(conn, db_path):
+    """
+    Tune the connection once at open: WAL journal with relaxed sync, a larger
+    page cache, in-memory temp store and memory-mapped reads.
+    """
+    # WAL needs to create -wal/-shm files next to the database; on read-only
+    # files or directories stay out of the way and keep the journal in memory
+    db_dir = os.path.dirname(os.path.abspath(db_path))
+    if os.access(db_path, os.W_OK) and os.access(db_dir, os.W_OK):
+        journal = ("journal_mode=WAL",)
+    else:
+        journal = ("query_only=1", "journal_mode=MEMORY")
+    try:
+        for pragma in journal:
+            conn.execute("PRAGMA " + pragma)
+    except sqlite3.DatabaseError:
+        pass
+    # one statement each: executescript() would also COMMIT first
+    for pragma in ("synchronous=NORMAL", "temp_store=MEMORY", "cache_size=-65536",
+                   "busy_timeout=5000", "mmap_size=268435456"):
+        conn.execute("PRAGMA " + pragma)
+    global _wal
+    _wal = conn.execute("PRAGMA journal_mode").fetchone()[0].lower() == 'wal'
+
+
+# row counts and page sizes per table, kept across menu entries so that the
+# COUNT(*) scans and the dbstat walk only run for tables that changed
+_counts = {}
+_sizes = {}
+# tables whose cached count is not exact: '~' for an estimate (see
+# estimate_rows), '+' for a lower bound
+_approx = {}
+# background thread filling _sizes, and a generation number bumped on every
+# invalidation so that a scan started before it does not store stale sizes
+_size_scan = None
+_stats_gen = 0
+# (data_version, schema_version) when the caches were last checked
+_db_versions = None
+
+
+def load_table_stats(conn, tables, stdscr=None, exact=False):
+    """
+    Fill the row count cache for the given tables that are not cached yet (sizes
+    are left to ensure_sizes). With stdscr, the counting can be cancelled with
+    ESC, leaving the remaining counts as None.
+    Unless exact is set, counting stops at APPROX_ROWS rows; such tables get an
+    estimate, or APPROX_ROWS as a lower bound, instead of an exact count.
+    """
+    check_db_versions(conn)
+    missing = [t for t in tables if t not in _counts]
+    if not missing:
+        return
+    limit = None if exact else APPROX_ROWS
+    cancelled = []
+    if stdscr is not None:
+        h, w = stdscr.getmaxyx()
+        try:
+            stdscr.addnstr(h-1, 0, "Computing... (ESC to cancel)", w-1)
+            stdscr.clrtoeol()
+        except curses.error:
+            pass
+        stdscr.refresh()
+        stdscr.nodelay(True)
+
+        def poll_cancel():
+            # called by SQLite every N VM instructions; non-zero aborts the query
+            if not cancelled:
+                ch = stdscr.getch()
+                if ch == 27:
+                    cancelled.append(ch)
+                elif ch != -1:
+                    curses.ungetch(ch)
+            return bool(cancelled)
+        conn.set_progress_handler(poll_cancel, 10000)
+    began = begin_read(conn)
+    try:
+        # COUNT(*) runs as a single VM instruction, so the progress handler
+        # rarely fires inside it; poll between chunks of tables as well
+        for i in range(0, len(missing), COUNT_CHUNK):
+            if stdscr is not None:
+                poll_cancel()
+            if cancelled:
+                break
+            count_rows(conn, missing[i:i+COUNT_CHUNK], limit)
+        for t in missing:
+            _counts.setdefault(t, None)
+    finally:
+        if stdscr is not None:
+            conn.set_progress_handler(None, 0)
+            stdscr.nodelay(False)
+    if limit is not None:
+        big = [t for t in missing if _counts[t] is not None and _counts[t] >= limit]
+        estimates = estimate_rows(conn, big)
+        for t in big:
+            n = estimates.get(t) or 0
+            _counts[t] = max(n, limit)
+            _approx[t] = '~' if n > limit else '+'
+    if began:
+        end_read(conn)
+
+
+def estimate_rows(conn, tables):
+    """
+    Estimate row counts without scanning: from sqlite_stat1 where ANALYZE has
+    run, otherwise from max(rowid), a single b-tree descent. max(rowid) is only
+    trusted when min(rowid) is 1, i.e. the rowids look like a plain sequence,
+    not like IDs from some other key space. Virtual tables, which could scan,
+    are skipped.
+    """
+    wanted = set(tables)
+    estimates = {}
+    try:
+        for tbl, stat in conn.execute("SELECT tbl, stat FROM sqlite_stat1"):
+            n = (stat or '').split(' ', 1)[0]
+            if tbl in wanted and n.isdigit():
+                estimates[tbl] = max(estimates.get(tbl, 0), int(n))
+    except sqlite3.DatabaseError:
+        pass
+    virtual = {row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type='table' AND sql LIKE 'CREATE VIRTUAL TABLE%'")}
+    for t in tables:
+        if t in estimates or t in virtual:
+            continue
+        try:
+            if conn.execute(table_sql('min_rowid', t)).fetchone()[0] == 1:
+                estimates[t] = conn.execute(table_sql('max_rowid', t)).fetchone()[0]
+        except sqlite3.DatabaseError:
+            pass
+    return estimates
+
+
+def count_rows(conn, tables, limit=None):
+    """
+    Count the rows of all given tables in one round trip: a UNION ALL of
+    per-table counts, each tagged with the table's position in the list.
+    With limit, no table is counted past that many rows.
+    If that fails (e.g. a table whose module is missing), count table by table
+    so that only the failing tables are left without a count.
+    """
+    source = "{}" if limit is None else "(SELECT 1 FROM {} LIMIT %d)" % limit
+    sql = " UNION ALL ".join(
+        f"SELECT {i}, COUNT(*) FROM " + source.format(quote_ident(t)) for i, t in enumerate(tables))
+    try:
+        for i, n in conn.execute(sql):
+            _counts[tables[i]] = n
+        return
+    except sqlite3.OperationalError as e:
+        if 'interrupted' in str(e):
+            return
+    except sqlite3.DatabaseError:
+        pass
+    for t in tables:
+        try:
+            if limit is None:
+                _counts[t] = conn.execute(table_sql('count', t)).fetchone()[0]
+            else:
+                _counts[t] = conn.execute(table_sql('count_upto', t), (limit,)).fetchone()[0]
+        except sqlite3.DatabaseError:
+            _counts[t] = None
+
+
+def ensure_sizes(conn, tables):
+    """
+    Start computing the sizes of the given tables that are not cached yet, for
+    the screens that show them; the record view never pays for a dbstat walk.
+    """
+    check_db_versions(conn)
+    missing = [t for t in tables if t not in _sizes]
+    if missing and not size_scan_running():
+        start_size_scan(conn, missing)
+
+
+def start_size_scan(conn, tables):
+    """
+    Compute approximate table sizes (requires the dbstat virtual table) without
+    blocking the UI: dbstat reads every page of the database, so the scan runs
+    on its own read-only connection in a daemon thread.
+    """
+    global _size_scan
+    path = next((row[2] for row in conn.execute("PRAGMA database_list") if row[1] == 'main'), '')
+    if not path:
+        # in-memory database: there is nothing another connection could open
+        scan_sizes(conn, tables, _stats_gen)
+        return
+    uri = pathlib.Path(path).as_uri() + '?mode=ro'
+    _size_scan = threading.Thread(target=scan_sizes_uri, args=(uri, tables, _stats_gen), daemon=True)
+    _size_scan.start()
+
+
+def size_scan_running():
+    return _size_scan is not None and _size_scan.is_alive()
+
+
+def scan_sizes_uri(uri, tables, gen):
+    try:
+        conn = sqlite3.connect(uri, uri=True)
+    except sqlite3.DatabaseError:
+        return
+    try:
+        scan_sizes(conn, tables, gen)
+    finally:
+        conn.close()
+
+
+def scan_sizes(conn, tables, gen):
+    # a few tables invalidated by an edit or delete: SQLite 3.31+ walks just
+    # their b-trees for a name= constraint and sums the pages itself
+    if len(tables) <= 10 and sqlite3.sqlite_version_info >= (3, 31, 0):
+        try:
+            sizes = {t: conn.execute("SELECT pgsize FROM dbstat "
+                                     "WHERE name=? AND aggregate=TRUE", (t,)).fetchone()
+                     for t in tables}
+        except sqlite3.DatabaseError:
+            pass
+        else:
+            for t, row in sizes.items():
+                if gen != _stats_gen:
+                    break
+                _sizes[t] = row and row[0]
+            return
+    # otherwise one GROUP BY pass over dbstat for all tables; fall back to a temp
+    # dbstat table on SQLite builds without the eponymous one
+    sql = "SELECT name, SUM(pgsize) FROM {} GROUP BY name"
     sizes = {}
-    use_dbstat = True
     try:
-        conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS dbstat USING dbstat")
+        sizes = {name: size for name, size in conn.execute(sql.format('dbstat'))}
     except sqlite3.OperationalError:
-        use_dbstat = False
-    for t in tables:
         try:
-            cnt = conn.execute(f"SELECT COUNT(*) FROM '{t}'").fetchone()[0]
+            conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS temp.dbstat USING dbstat")
+            sizes = {name: size for name, size in conn.execute(sql.format('temp.dbstat'))}
         except sqlite3.DatabaseError:
-            cnt = None
-        counts[t] = cnt
-        if use_dbstat:
-            try:
-                s = conn.execute("SELECT SUM(pgsize) FROM dbstat WHERE name = ?", (t,)).fetchone()[0]
-            except sqlite3.DatabaseError:
-                s = None
-            sizes[t] = s
+            pass
+    except sqlite3.DatabaseError:
+        pass
+    # checked per entry: an invalidation may land while the loop runs
+    for t in tables:
+        if gen != _stats_gen:
+            break
+        _sizes[t] = sizes.get(t)
+
+
+def check_db_versions(conn):
+    """
+    Drop all cached stats if the database changed behind the viewer's back:
+    data_version moves when another connection commits, schema_version when
+    any connection alters the schema. Changes made through the viewer itself
+    invalidate just what they touch (see invalidate_table_stats).
+    """
+    global _db_versions
+    versions = (conn.execute("PRAGMA data_version").fetchone()[0],
+                conn.execute("PRAGMA schema_version").fetchone()[0])
+    if versions != _db_versions:
+        if _db_versions is not None:
+            invalidate_table_stats()
+        _db_versions = versions
+
+
+def invalidate_table_stats(table=None):
+    """
+    Drop cached stats for one table, or for all tables when table is None.
+    """
+    global _stats_gen
+    _stats_gen += 1
+    if table is None:
+        _counts.clear()
+        _sizes.clear()
+        _approx.clear()
+    else:
+        _counts.pop(table, None)
+        _sizes.pop(table, None)
+        _approx.pop(table, None)
+
+
+def fmt_count(table):
+    """
+    Format a table's cached row count: '?' if unknown, '~N' if estimated,
+    'N+' if only known to be at least N.
+    """
+    cnt = _counts.get(table)
+    if cnt is None:
+        return '?'
+    mark = _approx.get(table)
+    if mark == '~':
+        return f"~{cnt}"
+    return f"{cnt}+" if mark else str(cnt)
+
+
+# control whitespace that would move the curses cursor off the current line
+_WHITESPACE = str.maketrans('\t\n\r\v\f', '     ')
+
+
+def wrap_text(text, width):
+    """
+    Hard-wrap text into pieces of at most width characters, one per screen line.
+    """
+    text = text.translate(_WHITESPACE)
+    if width <= 0:
+        return [text]
+    return [text[i:i+width] for i in range(0, len(text), width)]
+
+
+def render_line(values, width):
+    """
+    Join values with ' | ' the way the record view shows a row, stopping once
+    about width characters are produced. BLOBs are shown as their size only,
+    and tabs and line breaks as spaces so the line stays on one screen row.
+    """
+    parts = []
+    n = 0
+    for v in values:
+        if n >= width:
+            break
+        if isinstance(v, bytes):
+            text = f"<blob {len(v)} bytes>"
         else:
-            sizes[t] = None
+            text = str(v)[:width - n]
+        parts.append(text)
+        n += len(text) + 3
+    return ' | '.join(parts).translate(_WHITESPACE)
+
+
+# size units by power of 1024, and formatted sizes already seen (table sizes
+# rarely change between redraws)
+_UNITS = ('B', 'KB', 'MB', 'GB')
+_size_strs = {}
+
+
+def fmt_size(size):
+    """
+    Format a size in bytes as a short human-readable string.
+    """
+    text = _size_strs.get(size)
+    if text is None:
+        # the unit follows directly from the bit length: every 10 bits is x1024;
+        # whole units and the (truncated) tenth come from shifts, not floats
+        i = min(max(size.bit_length() - 1, 0) // 10, len(_UNITS) - 1)
+        if i:
+            shift = 10 * i
+            tenth = (size & ((1 << shift) - 1)) * 10 >> shift
+            text = "%d.%d%s" % (size >> shift, tenth, _UNITS[i])
+        else:
+            text = "%dB" % size
+        _size_strs[size] = text
+    return text
+
+
+def register_functions(conn):
+    """
+    Make fmt_size() available to queries typed at the SQL prompt.
+    """
+    def sql_fmt_size(size):
+        return None if size is None else fmt_size(int(size))
+    try:
+        conn.create_function('fmt_size', 1, sql_fmt_size, deterministic=True)
+    except (TypeError, sqlite3.NotSupportedError):
+        # deterministic= needs Python 3.8+ and SQLite 3.8.3+
+        conn.create_function('fmt_size', 1, sql_fmt_size)
+
+
+def table_menu(stdscr, conn):
+    def load_tables(exact=False):
+        names = [row['name'] for row in
+                 fetch_all(conn, "SELECT name FROM sqlite_master WHERE type='table' ORDER BY name")]
+        load_table_stats(conn, names, stdscr, exact)
+        ensure_sizes(conn, names)
+        return names
+
+    def format_lines():
+        # list view: one table per line (name + counts/sizes inline)
+        list_lines = []
+        for name in tables:
+            info = name
+            if _counts.get(name) is not None:
+                info += f" ({fmt_count(name)} rows"
+                size = _sizes.get(name)
+                if size is not None:
+                    info += f", {fmt_size(size)}"
+                info += ")"
+            list_lines.append(info)
+        # column view: table Name | Rows | Size
+        rows_vals = [fmt_count(t) for t in tables]
+        size_vals = ['' if _sizes.get(t) is None else fmt_size(_sizes[t]) for t in tables]
+        col1 = max(map(len, tables), default=4)
+        col2 = max(map(len, rows_vals), default=4)
+        col3 = max(map(len, size_vals), default=4)
+        fmt = f"{{:<{col1}}}  {{:>{col2}}}  {{:>{col3}}}"
+        hdr = fmt.format('Name', 'Rows', 'Size')
+        column_lines = [fmt.format(*vals) for vals in zip(tables, rows_vals, size_vals)]
+        return list_lines, hdr, column_lines
+
+    tables = load_tables()
+    if not tables:
+        return None
+    # menu lines only change when the table list or the stats are reloaded
+    list_lines, column_hdr, column_lines = format_lines()
+
+    def highlight(i, attr):
+        # recolour an already drawn menu line in place
+        lines = column_lines if column_view else list_lines
+        stdscr.chgat(first_y + i - top, 2, min(len(lines[i]), w-4), attr)
+
     idx = 0
+    top = 0  # first table shown
     # toggle between inline list view and 3-column view (default to column)
     column_view = True
+    # (idx, top) shown on screen; None when the whole menu must be drawn again
+    drawn = None
     while True:
-        stdscr.clear()
         h, w = stdscr.getmaxyx()
-        stdscr.addstr(0, 0, "Tables:")
-        if not column_view:
-            # list view: one table per line (name + counts/sizes inline)
-            for i, name in enumerate(tables):
-                y = i + 1
-                if y >= h - 1:
-                    break
-                attr = curses.A_REVERSE if i == idx else curses.A_NORMAL
-                info = name
-                cnt = counts.get(name)
-                if cnt is not None:
-                    info += f" ({cnt} rows"
-                    size = sizes.get(name)
-                    if size is not None:
-                        if size >= 1024*1024:
-                            info += f", {size/1024/1024:.1f}MB"
-                        elif size >= 1024:
-                            info += f", {size/1024:.1f}KB"
-                        else:
-                            info += f", {size}B"
-                    info += ")"
-                stdscr.addstr(y, 2, info[:w-4], attr)
+        # both views are built once per reload; a frame draws only the tables
+        # that fit, scrolled to keep the selection in view
+        lines = column_lines if column_view else list_lines
+        first_y = 2 if column_view else 1
+        visible = max(h - 1 - first_y, 1)
+        if idx < top:
+            top = idx
+        elif idx >= top + visible:
+            top = idx - visible + 1
+        if drawn is not None and drawn[1] == top:
+            # only the selection moved: swap the highlight on two lines
+            if drawn[0] != idx:
+                highlight(drawn[0], curses.A_NORMAL)
+                highlight(idx, curses.A_REVERSE)
         else:
-            # column view: table Name | Rows | Size
-            # prepare per-table values
-            rows_vals = [str(counts.get(t) or 0) for t in tables]
-            size_vals = []
-            for t in tables:
-                sz = sizes.get(t)
-                if sz is None:
-                    size_vals.append('')
-                elif sz >= 1024*1024:
-                    size_vals.append(f"{sz/1024/1024:.1f}MB")
-                elif sz >= 1024:
-                    size_vals.append(f"{sz/1024:.1f}KB")
-                else:
-                    size_vals.append(f"{sz}B")
-            # compute column widths
-            col1 = max((len(n) for n in tables), default=4)
-            col2 = max((len(v) for v in rows_vals), default=4)
-            col3 = max((len(v) for v in size_vals), default=4)
-            # header
-            hdr = f"{'Name':{col1}}  {'Rows':>{col2}}  {'Size':>{col3}}"
-            stdscr.addstr(1, 2, hdr[:w-4], curses.A_UNDERLINE)
-            # rows
-            for i, name in enumerate(tables):
-                y = i + 2
-                if y >= h - 1:
-                    break
+            # erase() only resets the virtual screen; the single doupdate() below
+            # sends just the cells that differ from what is on the terminal
+            stdscr.erase()
+            stdscr.addstr(0, 0, "Tables:")
+            if column_view:
+                stdscr.addnstr(1, 2, column_hdr, w-4, curses.A_UNDERLINE)
+            for i in range(top, min(top + visible, len(lines))):
                 attr = curses.A_REVERSE if i == idx else curses.A_NORMAL
-                line = f"{name:{col1}}  {rows_vals[i]:>{col2}}  {size_vals[i]:>{col3}}"
-                stdscr.addstr(y, 2, line[:w-4], attr)
-        help_str = "Up/Down: Navigate  Enter: Select  v: Toggle view  i: Schema  s: SQL query  q: Quit"
-        try:
-            stdscr.addstr(h-1, 0, help_str[:w])
-        except curses.error:
-            pass
-        stdscr.refresh()
+                stdscr.addnstr(first_y + i - top, 2, lines[i], w-4, attr)
+            help_str = "Up/Down: Navigate  Enter: Select  v: Toggle view  i: Schema  r: Reload  s: SQL query  q: Quit"
+            try:
+                stdscr.addnstr(h-1, 0, help_str, w-1)
+            except curses.error:
+                pass
+        drawn = (idx, top)
+        stdscr.noutrefresh()
+        curses.doupdate()
+        # while sizes are computed in the background, wake up periodically
+        # and redraw once they are in
+        scanning = size_scan_running()
+        stdscr.timeout(250 if scanning else -1)
         key = stdscr.getch()
+        stdscr.timeout(-1)
+        if scanning and not size_scan_running():
+            # a scan already running may not have covered every table
+            ensure_sizes(conn, tables)
+            list_lines, column_hdr, column_lines = format_lines()
+            drawn = None
+        if key == -1:
+            continue
+        if key not in (curses.KEY_DOWN, curses.KEY_UP, ord('j'), ord('k')):
+            drawn = None
         if key in (ord('i'),):
             view_schema(stdscr, conn, tables[idx])
         if key == ord('s'):
             run_sql(stdscr, conn)
+            tables = load_tables()
+            if not tables:
+                return None
+            idx = min(idx, len(tables)-1)
+            list_lines, column_hdr, column_lines = format_lines()
         if key in (curses.KEY_DOWN, ord('j')):
             idx = min(idx+1, len(tables)-1)
         elif key in (curses.KEY_UP, ord('k')):
@@ -165,103 +654,274 @@ def table_menu(stdscr, conn):
             return None
         elif key == ord('v'):
             column_view = not column_view
+        elif key in (ord('r'), ord('R')):
+            # R counts every table exactly, estimated ones included
+            invalidate_table_stats()
+            tables = load_tables(exact=key == ord('R'))
+            if not tables:
+                return None
+            idx = min(idx, len(tables)-1)
+            list_lines, column_hdr, column_lines = format_lines()
         elif key in (curses.KEY_ENTER, 10, 13):
             return tables[idx]
 
 
 def view_table(stdscr, conn, table):
-    def load_rows():
-        data = conn.execute(f"SELECT rowid AS __rowid__, * FROM '{table}'").fetchall()
-        if data:
-            cols = data[0].keys()[1:]
+    # rows are fetched in pages of PAGE_SIZE ordered by rowid; the most recently
+    # used pages are kept so that scrolling only hits the database at page edges
+    pages = collections.OrderedDict()
+    next_page_sql = table_sql('next', table)
+    prev_page_sql = table_sql('prev', table)
+    offset_page_sql = table_sql('offset', table)
+    # column names, taken from the first page query (see read_page)
+    cols = []
+    total = 0
+    # False while the row count is unknown (counting was cancelled): total then
+    # runs one row ahead of the rows loaded so far and grows page by page
+    counted = True
+    # page queries return plain tuples: no sqlite3.Row wrapper per row, the
+    # column names are already known
+    page_cur = conn.cursor()
+    page_cur.row_factory = None
+
+    def reload():
+        # in WAL mode browsing runs inside one read transaction; reloading
+        # starts a fresh snapshot so changes committed elsewhere become visible
+        nonlocal total, counted
+        end_read(conn)
+        begin_browse(conn)
+        pages.clear()
+        wrapped.clear()
+        if _counts.get(table) is None:
+            # not counted yet, or the count was cancelled in the table menu
+            invalidate_table_stats(table)
+        load_table_stats(conn, [table], stdscr)
+        count = _counts.get(table)
+        # an estimated count is no good for paging; find the end while scrolling
+        counted = count is not None and table not in _approx
+        total = count if counted else 0
+        # load the first page right away: it is shown first, a lazy total
+        # starts from it, and its query names the columns
+        fetch_page(0)
+
+    def read_page(page):
+        prev, nxt = pages.get(page - 1), pages.get(page + 1)
+        backwards = False
+        if prev and prev[1]:
+            # keyset: continue right after the last rowid of the previous page
+            page_cur.execute(next_page_sql, (prev[1][-1], PAGE_SIZE))
+        elif nxt and nxt[1]:
+            # scrolling back: the page ends right before the first rowid of the next one
+            page_cur.execute(prev_page_sql, (nxt[1][0], PAGE_SIZE))
+            backwards = True
         else:
-            cols = [col[1] for col in conn.execute(f"PRAGMA table_info('{table}')")]
-        rowids = [row['__rowid__'] for row in data]
-        rows = [tuple(row)[1:] for row in data]
-        return cols, rows, rowids
+            page_cur.execute(offset_page_sql, (PAGE_SIZE, page * PAGE_SIZE))
+        if not cols:
+            cols.extend(d[0] for d in page_cur.description[1:])
+        rows = page_cur.fetchall()
+        if backwards:
+            rows.reverse()
+        return rows
 
-    cols, rows, rowids = load_rows()
+    def fetch_page(page):
+        nonlocal total, counted
+        if page in pages:
+            pages.move_to_end(page)
+            return pages[page]
+        try:
+            rows = read_page(page)
+        except sqlite3.OperationalError as e:
+            if not allow_invalid_text(conn, e):
+                raise
+            rows = read_page(page)
+        # display lines are rendered once per page, not on every keypress, and
+        # only as far as a full screen could ever show
+        h, w = stdscr.getmaxyx()
+        lines = [render_line(row[1:], h * w) for row in rows]
+        # the values are kept by column: one tuple per column instead of one
+        # per row, and the rowids as a C array of 64-bit integers
+        columns = list(zip(*rows)) or [()]
+        rowids = array.array('q', columns[0])
+        end = page * PAGE_SIZE + len(rows)
+        if len(rows) < PAGE_SIZE:
+            if not counted:
+                # reached the last page: the count is exact from here on
+                counted = True
+                _counts[table] = total = end
+                _approx.pop(table, None)
+            elif end < total:
+                # the cached count is ahead of the table (rows deleted elsewhere)
+                total = end
+        elif not counted:
+            total = max(total, end + 1)
+        pages[page] = (columns[1:], rowids, lines)
+        if len(pages) > PAGE_CACHE:
+            pages.popitem(last=False)
+        return pages[page]
+
+    # wrap mode: wrapped lines per (row, width), pruned to the rows on screen
+    wrapped = {}
+
+    def wrapped_at(ridx, width):
+        key = (ridx, width)
+        if key not in wrapped:
+            line = row_at(ridx)[1]
+            wrapped[key] = None if line is None else wrap_text(line, width)
+        return wrapped[key]
+
+    def row_at(ridx):
+        # (rowid, display line) of a row, or Nones past the end of the table
+        _, rowids, lines = fetch_page(ridx // PAGE_SIZE)
+        i = ridx % PAGE_SIZE
+        if i < len(rowids):
+            return rowids[i], lines[i]
+        return None, None
+
+    def record_at(ridx):
+        # the row's values, put back together from the page's columns
+        columns = fetch_page(ridx // PAGE_SIZE)[0]
+        return tuple(col[ridx % PAGE_SIZE] for col in columns)
+
+    def highlight(ridx, attr):
+        # recolour an already drawn record line in place
+        y = top + ridx - start
+        line = row_at(ridx)[1]
+        if line is not None and y < h - 1:
+            stdscr.chgat(y, 0, min(len(line), w), attr)
+
+    reload()
     idx = 0
     start = 0  # track which row to start display from
     wrap = False
+    # (idx, start, total) shown on screen; None when the frame must be drawn again
+    drawn = None
+    header_key = None
     while True:
-        stdscr.clear()
         h, w = stdscr.getmaxyx()
-        title = f"Table: {table} ({len(rows)} rows)"
-        stdscr.addstr(0, 0, title[:w])
-        hdr = ' | '.join(cols)
-        # Header (wrap column names when wrapping enabled)
-        header_lines = textwrap.wrap(hdr, w) if wrap else [hdr]
-        for i, hline in enumerate(header_lines):
-            stdscr.addstr(1 + i, 0, hline[:w], curses.A_UNDERLINE)
-        # Rows
-        if not wrap:
-            visible = h - 3 - len(header_lines)
-            for i in range(visible):
-                ridx = start + i
-                if ridx >= len(rows):
-                    break
-                row = rows[ridx]
-                line = ' | '.join(str(x) for x in row)
-                attr = curses.A_REVERSE if ridx == idx else curses.A_NORMAL
-                stdscr.addstr(1 + len(header_lines) + i, 0, line[:w], attr)
+        # taken before drawing: loading a page may still correct the total
+        frame = (idx, start, total)
+        if drawn is not None and not wrap and drawn[1:] == frame[1:]:
+            # only the selection moved within the same rows: swap the highlight
+            if drawn[0] != idx:
+                highlight(drawn[0], curses.A_NORMAL)
+                highlight(idx, curses.A_REVERSE)
         else:
-            # wrap mode: display rows starting at 'start', wrapping long lines
-            y = 1 + len(header_lines)
-            for ridx in range(start, len(rows)):
-                if y >= h-1:
-                    break
-                row = rows[ridx]
-                line = ' | '.join(str(x) for x in row)
-                wrapped = textwrap.wrap(line, w)
-                for part in wrapped:
-                    if y >= h-1:
+            stdscr.erase()
+            if counted:
+                title = f"Table: {table} ({total} rows)"
+            else:
+                title = f"Table: {table} ({total - 1}+ rows)"
+            stdscr.addnstr(0, 0, title, w)
+            # Header (wrap column names when wrapping enabled); the column
+            # names never change, so it is laid out again only for a new size
+            if header_key != (h, w, wrap):
+                header_key = (h, w, wrap)
+                hdr = render_line(cols, h * w)
+                header_lines = wrap_text(hdr, w) if wrap else [hdr]
+            for i, hline in enumerate(header_lines):
+                stdscr.addnstr(1 + i, 0, hline, w, curses.A_UNDERLINE)
+            # Rows
+            top = 1 + len(header_lines)
+            if not wrap:
+                visible = h - 3 - len(header_lines)
+                for i in range(visible):
+                    ridx = start + i
+                    if ridx >= total:
+                        break
+                    line = row_at(ridx)[1]
+                    if line is None:
                         break
                     attr = curses.A_REVERSE if ridx == idx else curses.A_NORMAL
+                    stdscr.addnstr(top + i, 0, line, w, attr)
+            else:
+                # wrap mode: display rows starting at 'start', wrapping long lines;
+                # flatten the frame to (row, text) screen lines first
+                screen = []
+                for ridx in range(start, total):
+                    if top + len(screen) >= h-1:
+                        break
+                    parts = wrapped_at(ridx, w)
+                    if parts is None:
+                        break
+                    screen.extend((ridx, part) for part in parts)
+                shown = {ridx for ridx, _ in screen}
+                for k in [k for k in wrapped if k[0] not in shown or k[1] != w]:
+                    del wrapped[k]
+                for y, (ridx, part) in enumerate(screen[:h-1-top], top):
+                    attr = curses.A_REVERSE if ridx == idx else curses.A_NORMAL
                     stdscr.addstr(y, 0, part, attr)
-                    y += 1
-        help_str = "Up/Down: Navigate  e: Edit  d: Delete  r: Reload  i: Schema  w: Wrap  s: SQL  b/q: Back"
-        try:
-            stdscr.addstr(h-1, 0, help_str[:w])
-        except curses.error:
-            pass
-        stdscr.refresh()
+            help_str = "Up/Down: Navigate  e: Edit  d: Delete  r: Reload  i: Schema  w: Wrap  s: SQL  b/q: Back"
+            try:
+                stdscr.addnstr(h-1, 0, help_str, w-1)
+            except curses.error:
+                pass
+        drawn = frame
+        stdscr.noutrefresh()
+        curses.doupdate()
         key = stdscr.getch()
+        if key not in (curses.KEY_DOWN, curses.KEY_UP, ord('j'), ord('k')):
+            drawn = None
 
         if key in (curses.KEY_DOWN, ord('j')):
-            if idx < len(rows) - 1:
+            # with an unknown count the next row may turn out not to exist
+            if idx < total - 1 and (counted or row_at(idx + 1)[0] is not None):
                 idx += 1
         elif key in (curses.KEY_UP, ord('k')):
             if idx > 0:
                 idx -= 1
         elif key == ord('r'):
-            cols, rows, rowids = load_rows()
+            invalidate_table_stats(table)
+            reload()
             idx = start = 0
             continue
         elif key in (ord('b'), ord('q'), 27):
+            end_read(conn)
             break
         elif key == ord('i'):
             view_schema(stdscr, conn, table)
-            cols, rows, rowids = load_rows()
             continue
         elif key == ord('w'):
             wrap = not wrap
             continue
+        elif key == curses.KEY_RESIZE:
+            # page lines are cut to the screen size; render them again
+            pages.clear()
+            wrapped.clear()
+            continue
         elif key == ord('s'):
+            end_read(conn)
             run_sql(stdscr, conn)
-            cols, rows, rowids = load_rows()
+            reload()
             idx = start = 0
             continue
-        elif key == ord('d') and rows:
-            if confirm(stdscr, f"Delete row {idx+1}/{len(rows)}? (y/N)"):
-                conn.execute(f"DELETE FROM '{table}' WHERE rowid=?", (rowids[idx],))
-                conn.commit()
-                cols, rows, rowids = load_rows()
-                idx = start = 0
+        elif key == ord('d') and total:
+            if confirm(stdscr, f"Delete row {idx+1}/{total}? (y/N)"):
+                rowid = row_at(idx)[0]
+                # a write from inside an older snapshot fails with SQLITE_BUSY
+                # once another connection has committed; start from the latest
+                end_read(conn)
+                try:
+                    conn.execute(table_sql('delete', table), (rowid,))
+                    conn.commit()
+                except sqlite3.OperationalError as e:
+                    notify(stdscr, f"Delete failed: {e}")
+                else:
+                    invalidate_table_stats(table)
+                    idx = start = 0
+                reload()
             continue
-        elif key == ord('e') and rows:
-            edit_row(conn, table, cols, rows[idx], rowids[idx])
-            cols, rows, rowids = load_rows()
+        elif key == ord('e') and total:
+            rowid = row_at(idx)[0]
+            if rowid is not None:
+                row = record_at(idx)
+                # don't hold the transaction open while the editor runs
+                end_read(conn)
+                if edit_row(stdscr, conn, table, cols, row, rowid):
+                    invalidate_table_stats(table)
+                    reload()
+                    idx = min(idx, max(total - 1, 0))
+                else:
+                    begin_browse(conn)
             continue
 
         # adjust scroll window: in wrap mode, jump to selected row; else scroll by rows
@@ -278,27 +938,69 @@ def view_table(stdscr, conn, table):
 
 def confirm(stdscr, message):
     h, w = stdscr.getmaxyx()
-    stdscr.addstr(h-2, 0, message[:w])
+    stdscr.addnstr(h-2, 0, message, w)
     stdscr.clrtoeol()
     stdscr.refresh()
     key = stdscr.getch()
     return key in (ord('y'), ord('Y'))
 
+
+def notify(stdscr, message):
+    """
+    Show a message above the help line until a key is pressed.
+    """
+    h, w = stdscr.getmaxyx()
+    stdscr.addnstr(h-2, 0, message + " (press a key)", w)
+    stdscr.clrtoeol()
+    stdscr.refresh()
+    stdscr.getch()
+
+# everything the schema view shows, fetched in one statement: each row is
+# tagged with its section and a sort key; {info} is pragma_table_xinfo, or
+# pragma_table_info on SQLite builds that predate it
+_SCHEMA_SQL = """
+SELECT 'enc', 0, 0, encoding, NULL, NULL, NULL, NULL, NULL FROM pragma_encoding
+UNION ALL
+SELECT 'ddl', 0, 0, sql, NULL, NULL, NULL, NULL, NULL
+  FROM sqlite_master WHERE type='table' AND name=:t
+UNION ALL
+SELECT 'col', cid, 0, name, type, "notnull", dflt_value, pk, {hidden} FROM {info}(:t)
+UNION ALL
+SELECT 'idx', il.seq, ii.seqno, il.name, il."unique", coalesce(ii.name, '<expr>'), NULL, NULL, NULL
+  FROM pragma_index_list(:t) AS il LEFT JOIN pragma_index_info(il.name) AS ii
+UNION ALL
+SELECT 'fk', id, seq, "table", "to", "from", on_update, on_delete, NULL
+  FROM pragma_foreign_key_list(:t)
+UNION ALL
+SELECT 'trg', 0, 0, name, sql, NULL, NULL, NULL, NULL
+  FROM sqlite_master WHERE type='trigger' AND tbl_name=:t
+ORDER BY 1, 2, 3
+"""
+
+# CREATE TABLE statement split into its head, column list and tail
+_DDL_RE = re.compile(r'^(CREATE TABLE.*?\()(.*)(\).*)$', re.IGNORECASE | re.DOTALL)
+_DDL_PUNCT_RE = re.compile(r'[(),]')
+
+
 def view_schema(stdscr, conn, table):
     h, w = stdscr.getmaxyx()
-    encoding = conn.execute("PRAGMA encoding").fetchone()[0]
-    try:
-        ddl = conn.execute(
-            "SELECT sql FROM sqlite_master WHERE type='table' AND name=?", (table,)
-        ).fetchone()[0] or ''
-    except Exception:
-        ddl = ''
+    began = begin_read(conn)
     try:
-        cols_info = conn.execute(f"PRAGMA table_xinfo('{table}')").fetchall()
+        items = fetch_all(conn, _SCHEMA_SQL.format(info='pragma_table_xinfo', hidden='hidden'),
+                          {'t': table})
         hidden_col = True
-    except sqlite3.DatabaseError:
-        cols_info = conn.execute(f"PRAGMA table_info('{table}')").fetchall()
+    except sqlite3.OperationalError as e:
+        # only SQLite builds before 3.26 lack table_xinfo; anything else is real
+        if 'pragma_table_xinfo' not in str(e):
+            raise
+        items = fetch_all(conn, _SCHEMA_SQL.format(info='pragma_table_info', hidden='0'),
+                          {'t': table})
         hidden_col = False
+    sections = collections.defaultdict(list)
+    for item in items:
+        sections[item[0]].append(tuple(item)[3:])
+    encoding = sections['enc'][0][0] if sections['enc'] else ''
+    ddl = (sections['ddl'][0][0] if sections['ddl'] else None) or ''
     headers = ['Name', 'Type', 'Limit', 'Not Null', 'Default', 'PK']
     if hidden_col:
         headers.append('Hidden')
@@ -306,108 +1008,108 @@ def view_schema(stdscr, conn, table):
     rows.append((f"Schema: {table} (encoding: {encoding})", curses.A_BOLD))
     rows.append(("", 0))
     # Pretty-print CREATE TABLE DDL
-    m = re.match(r'^(CREATE TABLE.*?\()(.*)(\).*)$', ddl, flags=re.IGNORECASE|re.DOTALL)
+    m = _DDL_RE.match(ddl)
     if m:
         pre, body, post = m.group(1), m.group(2), m.group(3)
         rows.append((pre, 0))
-        parts, buf, depth = [], [], 0
-        for ch in body:
+        # split at top-level commas, visiting only the punctuation
+        parts, prev, depth = [], 0, 0
+        for punct in _DDL_PUNCT_RE.finditer(body):
+            ch = punct.group()
             if ch == '(':
                 depth += 1
             elif ch == ')':
                 depth -= 1
-            if ch == ',' and depth == 0:
-                parts.append(''.join(buf)); buf = []
-            else:
-                buf.append(ch)
-        if buf:
-            parts.append(''.join(buf))
+            elif depth == 0:
+                parts.append(body[prev:punct.start()])
+                prev = punct.end()
+        if body[prev:]:
+            parts.append(body[prev:])
         for i, part in enumerate(parts):
             chunk = part.strip() + (',' if i < len(parts)-1 else '')
-            for wline in textwrap.wrap(chunk, w-4):
+            for wline in wrap_text(chunk, w-4):
                 rows.append(('    ' + wline, 0))
         rows.append((post, 0))
     else:
-        for line in textwrap.wrap(ddl, w):
+        for line in wrap_text(ddl, w):
             rows.append((line, 0))
     rows.append(("", 0))
-    col_widths = [len(h) for h in headers]
     data = []
-    for ci in cols_info:
-        name = ci['name']
-        typ = ci['type'] or ''
-        m = re.search(r"\((\d+)\)", typ)
-        limit = m.group(1) if m else ''
-        notnull = 'YES' if ci['notnull'] else 'NO'
-        default = ci['dflt_value'] or ''
-        pk = str(ci['pk']) if ci['pk'] else ''
-        hidden = 'YES' if hidden_col and ci['hidden'] else ''
+    for name, typ, ci_notnull, ci_default, ci_pk, ci_hidden in sections['col']:
+        typ = typ or ''
+        # size limit from types like VARCHAR(20); DECIMAL(10,2) has none
+        lp = typ.find('(')
+        rp = typ.find(')', lp + 1)
+        limit = typ[lp+1:rp] if 0 <= lp < rp else ''
+        if not limit.isdigit():
+            limit = ''
+        notnull = 'YES' if ci_notnull else 'NO'
+        default = ci_default or ''
+        pk = str(ci_pk) if ci_pk else ''
+        hidden = 'YES' if hidden_col and ci_hidden else ''
         row = [name, typ, limit, notnull, default, pk]
         if hidden_col:
             row.append(hidden)
         data.append(row)
-        for i, cell in enumerate(row):
-            col_widths[i] = max(col_widths[i], len(str(cell)))
-    hdr_line = '  '.join(h.ljust(col_widths[i]) for i, h in enumerate(headers))
+    # widths per column of the transposed table, measured by map() in C
+    columns = list(zip(*data)) or [()] * len(headers)
+    col_widths = [max(len(hd), max(map(len, map(str, col)), default=0))
+                  for hd, col in zip(headers, columns)]
+    hdr_line = '  '.join(map(str.ljust, headers, col_widths))
     rows.append((hdr_line, curses.A_UNDERLINE))
     for rec in data:
-        line = '  '.join(str(rec[i]).ljust(col_widths[i]) for i in range(len(rec)))
+        line = '  '.join(map(str.ljust, map(str, rec), col_widths))
         rows.append((line, 0))
     rows.append(("", 0))
     rows.append(("Indices:", curses.A_UNDERLINE))
-    for info in conn.execute(f"PRAGMA index_list('{table}')"):
-        name = info['name']; uniq = 'YES' if info['unique'] else 'NO'
-        cols = [r['name'] for r in conn.execute(f"PRAGMA index_info('{name}')")]
+    indices = collections.OrderedDict()
+    for name, unique, col, _, _, _ in sections['idx']:
+        indices.setdefault((name, unique), []).append(col)
+    for (name, unique), cols in indices.items():
+        uniq = 'YES' if unique else 'NO'
         text = f"{name} (unique: {uniq}) columns: {', '.join(cols)}"
-        for part in textwrap.wrap(text, w-2):
+        for part in wrap_text(text, w-2):
             rows.append((f"  {part}", 0))
     rows.append(("", 0))
     rows.append(("Foreign keys:", curses.A_UNDERLINE))
-    for fk in conn.execute(f"PRAGMA foreign_key_list('{table}')"):
-        txt = (f"{fk['table']}({fk['to']}) <- {fk['from']} "
-               f"on_update={fk['on_update']} on_delete={fk['on_delete']}")
-        for part in textwrap.wrap(txt, w-2):
+    for fk_table, fk_to, fk_from, on_update, on_delete, _ in sections['fk']:
+        txt = (f"{fk_table}({fk_to}) <- {fk_from} "
+               f"on_update={on_update} on_delete={on_delete}")
+        for part in wrap_text(txt, w-2):
             rows.append((f"  {part}", 0))
     rows.append(("", 0))
-    cnt = conn.execute(f"SELECT COUNT(*) FROM '{table}'").fetchone()[0]
-    sz = None
-    try:
-        conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS dbstat USING dbstat")
-        sz = conn.execute("SELECT SUM(pgsize) FROM dbstat WHERE name=?", (table,)).fetchone()[0]
-    except sqlite3.DatabaseError:
-        pass
-    stat = f"Rows: {cnt}"
+    load_table_stats(conn, [table], stdscr)
+    # one table's aggregate dbstat walk is cheap enough to wait for
+    if table not in _sizes:
+        scan_sizes(conn, [table], _stats_gen)
+    sz = _sizes.get(table)
+    if began:
+        end_read(conn)
+    stat = f"Rows: {fmt_count(table)}"
     if sz is not None:
-        if sz >= 1024*1024:
-            stat += f", Size: {sz/1024/1024:.1f}MB"
-        elif sz >= 1024:
-            stat += f", Size: {sz/1024:.1f}KB"
-        else:
-            stat += f", Size: {sz}B"
+        stat += f", Size: {fmt_size(sz)}"
     rows.append((stat, 0))
     rows.append(("", 0))
     rows.append(("Triggers:", curses.A_UNDERLINE))
-    for trig in conn.execute("SELECT name, sql FROM sqlite_master WHERE type='trigger' AND tbl_name=?", (table,)):
-        ln = f"{trig['name']}: {trig['sql'] or ''}"
-        for part in textwrap.wrap(ln, w-2):
+    for trig_name, trig_sql, _, _, _, _ in sections['trg']:
+        ln = f"{trig_name}: {trig_sql or ''}"
+        for part in wrap_text(ln, w-2):
             rows.append((f"  {part}", 0))
 
-    h, w = stdscr.getmaxyx()
-    pad = curses.newpad(len(rows)+1, w)
-    for i, (text, attr) in enumerate(rows):
-        try:
-            pad.addnstr(i, 0, text, w-1, attr)
-        except curses.error:
-            pass
     pos = 0
+    footer = "Up/Down: Scroll  b/q/ESC: Back"
     while True:
-        pad.refresh(pos, 0, 0, 0, h-2, w-1)
-        footer = "Up/Down: Scroll  b/q/ESC: Back"
+        # draw just the lines in view; curses sends only what scrolled
+        h, w = stdscr.getmaxyx()
+        stdscr.erase()
+        for y, (text, attr) in enumerate(rows[pos:pos+h-1]):
+            stdscr.addnstr(y, 0, text, w-1, attr)
         try:
             stdscr.addnstr(h-1, 0, footer, w-1, curses.A_DIM)
         except curses.error:
             pass
-        stdscr.refresh()
+        stdscr.noutrefresh()
+        curses.doupdate()
         key = stdscr.getch()
         if key in (curses.KEY_DOWN, ord('j')) and pos < len(rows) - (h-1):
             pos += 1
@@ -417,38 +1119,75 @@ def view_schema(stdscr, conn, table):
             break
 
 
-def edit_row(conn, table, cols, row, rowid):
-    data = {col: row[i] for i, col in enumerate(cols)}
-    with tempfile.NamedTemporaryFile('w+', delete=False, suffix='.json') as tf:
-        tf.write(json.dumps(data, indent=2, ensure_ascii=False))
-        tf.flush()
+def dump_record(data):
+    """
+    Serialize a record to indented JSON for editing. BLOB values are written as
+    {"__b64__": "<base64>"} since JSON has no bytes type.
+    """
+    data = {k: {'__b64__': base64.b64encode(v).decode('ascii')} if isinstance(v, bytes) else v
+            for k, v in data.items()}
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2).decode()
+    return json.dumps(data, indent=2, ensure_ascii=False)
 
-        # Suspend curses before calling external editor
-        curses.endwin()
 
-        editor = os.environ.get('EDITOR', 'vi')
-        subprocess.call([editor, tf.name])
+def load_record(text):
+    """
+    Parse a record written by dump_record, turning {"__b64__": ...} back into bytes.
+    """
+    data = orjson.loads(text) if orjson is not None else json.loads(text)
+    return {k: base64.b64decode(v['__b64__']) if isinstance(v, dict) and list(v) == ['__b64__'] else v
+            for k, v in data.items()}
 
-        # Resume curses after editing
-        stdscr = curses.initscr()
-        curses.noecho()
-        curses.cbreak()
-        stdscr.keypad(True)
-        curses.curs_set(0)
-        curses.flushinp()  # Flush any editor leftovers
 
-        tf.seek(0)
-        try:
-            newdata = json.load(tf)
-        except Exception:
-            return
-    os.unlink(tf.name)
-    keys = [k for k in cols if k in newdata]
-    vals = [newdata[k] for k in keys]
-    set_clause = ', '.join(f"{k}=?" for k in keys)
-    sql = f"UPDATE '{table}' SET {set_clause} WHERE rowid=?"
-    conn.execute(sql, vals + [rowid])
+def resume_curses(stdscr):
+    """
+    Return to the curses UI after curses.endwin(). Refreshing the existing
+    screen restores the saved terminal modes and repaints it; there is no
+    need to go through initscr() and terminfo setup again.
+    """
+    stdscr.refresh()
+    curses.curs_set(0)
+    curses.flushinp()  # Flush any leftovers typed outside curses
+
+
+# one scratch file reused for every edit, removed at exit
+_edit_path = None
+
+
+def edit_row(stdscr, conn, table, cols, row, rowid):
+    """
+    Edit a record as JSON in $EDITOR and write back the columns that changed.
+    Returns True if the row was updated.
+    """
+    global _edit_path
+    if _edit_path is None:
+        fd, _edit_path = tempfile.mkstemp(suffix='.json')
+        os.close(fd)
+        atexit.register(os.unlink, _edit_path)
+    data = {col: row[i] for i, col in enumerate(cols)}
+    with open(_edit_path, 'w') as f:
+        f.write(dump_record(data))
+
+    # Suspend curses while the external editor runs
+    curses.endwin()
+    editor = os.environ.get('EDITOR', 'vi')
+    subprocess.call([editor, _edit_path])
+    resume_curses(stdscr)
+
+    try:
+        # reopen by path: editors that save by replacing the file are fine too
+        with open(_edit_path) as f:
+            newdata = load_record(f.read())
+    except Exception:
+        return False
+    # only rewrite the columns that actually changed
+    keys = tuple(k for k in cols if k in newdata and newdata[k] != data[k])
+    if not keys:
+        return False
+    conn.execute(table_sql('update', table, keys), [newdata[k] for k in keys] + [rowid])
     conn.commit()
+    return True
 
 
 def run_sql(stdscr, conn):
@@ -462,31 +1201,46 @@ def run_sql(stdscr, conn):
     except EOFError:
         sql = ''
     if sql.strip():
+        changes = conn.total_changes
         try:
             cur = conn.execute(sql)
             conn.commit()
+            # anything that is not a plain read may have touched any table
+            if cur.description is None or conn.total_changes != changes:
+                invalidate_table_stats()
             if cur.description:
                 cols = [d[0] for d in cur.description]
                 print(" | ".join(cols))
-                rows = cur.fetchall()
-                for row in rows:
-                    print(" | ".join(str(x) for x in row))
-                print(f"{len(rows)} row(s) returned")
+                # stream the result in batches: one write per batch, and the
+                # full result set is never held in memory
+                cur.arraysize = 1000
+                nrows = 0
+                try:
+                    while True:
+                        batch = cur.fetchmany()
+                        if not batch:
+                            break
+                        sys.stdout.write('\n'.join(' | '.join(map(str, row)) for row in batch) + '\n')
+                        sys.stdout.flush()
+                        nrows += len(batch)
+                except KeyboardInterrupt:
+                    # Ctrl-C stops a long listing instead of leaving the browser
+                    print(f"\nInterrupted after {nrows} row(s)")
+                    cur.close()
+                else:
+                    print(f"{nrows} row(s) returned")
             else:
                 print("Query executed successfully.")
         except sqlite3.DatabaseError as e:
             print(f"SQL error: {e}")
+            if allow_invalid_text(conn, e):
+                print("Invalid UTF-8 text will be shown with replacement characters; run the query again.")
         except Exception as e:
             print(f"Error: {type(e).__name__}: {e}")
     else:
         print("No SQL entered.")
     input("Press Enter to continue...")
-    stdscr = curses.initscr()
-    curses.noecho()
-    curses.cbreak()
-    stdscr.keypad(True)
-    curses.curs_set(0)
-    curses.flushinp()
+    resume_curses(stdscr)
 
 if __name__ == '__main__':
     if len(sys.argv) > 1: